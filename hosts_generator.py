@@ -7,23 +7,57 @@
 
 import os
 import sys
+import pickle
+import argparse
+import functools
 import socket
+import sqlite3
+import asyncio
+import multiprocessing
 import platform
+import random
+import re
+import select
 import shutil
+import struct
 import subprocess
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import zlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Callable, List, Tuple, Optional, NamedTuple
 from threading import Lock
 
 # Попытка импортировать dnspython (опционально)
 try:
+    import dns.exception
     import dns.resolver
     HAS_DNSPYTHON = True
 except ImportError:
     HAS_DNSPYTHON = False
 
+# Попытка импортировать aiodns для асинхронного резолва (опционально)
+try:
+    import aiodns
+    HAS_AIODNS = True
+except ImportError:
+    HAS_AIODNS = False
+
+# Попытка импортировать uvloop для ускорения цикла событий (опционально)
+try:
+    import uvloop
+    HAS_UVLOOP = True
+except ImportError:
+    HAS_UVLOOP = False
+
+# Попытка импортировать numba для JIT-компиляции нечеткого сравнения доменов (опционально)
+try:
+    import numpy as np
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
 # Попытка импортировать tqdm для прогресс-бара (опционально)
 try:
     from tqdm import tqdm
@@ -31,9 +65,88 @@ try:
 except ImportError:
     HAS_TQDM = False
 
-# Глобальные счетчики для прогресса
-progress_lock = Lock()
-progress_counter = {'success': 0, 'failed': 0, 'total': 0}
+# Популярные TLD для попытки резолва вариантов домена
+COMMON_TLDS = ['com', 'net', 'org', 'ru', 'io', 'co', 'info', 'top', 'xyz', 'site']
+
+# Порт DNS серверов (UDP и TCP)
+DNS_PORT = 53
+
+# Хвост DNS вопроса после QNAME: QTYPE=A, QCLASS=IN
+DNS_QUESTION_A_IN = b'\x00\x01\x00\x01'
+
+# Заранее закодированные хвосты вопросов для популярных TLD: метка TLD + конец QNAME + A/IN
+TLD_QUESTIONS = {tld: bytes([len(tld)]) + tld.encode('ascii') + b'\x00' + DNS_QUESTION_A_IN
+                 for tld in COMMON_TLDS}
+
+# Максимум одновременно резолвящихся доменов в асинхронном режиме
+# (каждый домен может держать несколько запросов: гонка серверов, варианты TLD)
+ASYNC_MAX_DOMAINS = 500
+
+# Число TCP соединений с каждым сервером пула в режиме --tcp
+TCP_CONNECTIONS_PER_SERVER = 4
+# Максимум неотвеченных запросов в одном TCP соединении
+TCP_MAX_PIPELINED = 64
+
+# Задержка между запуском параллельных запросов к разным DNS серверам (секунды)
+RACE_STAGGER = 0.05
+
+# Заголовок генерируемого файла hosts
+HOSTS_HEADER = (
+    "# Файл hosts, сгенерированный автоматически\n"
+    "# Для применения: скопируйте содержимое в /etc/hosts (Linux) или C:\\Windows\\System32\\drivers\\etc\\hosts (Windows)\n"
+    "\n"
+)
+
+# Разбор строк файла с доменами: префиксы схемы/www и хвост (путь, порт)
+_PREFIX_RE = re.compile(r'^(?:https?://)?(?:www\.)?')
+_TAIL_RE = re.compile(r'[/:].*$')
+READ_BUFFER_SIZE = 1 << 20
+WRITE_BUFFER_SIZE = 1 << 20  # Буфер записи файла hosts
+
+# Домены резолвятся окнами: результаты окна выводятся до начала следующего,
+# поэтому в памяти держатся результаты и задачи не больше чем одного окна
+RESOLVE_WINDOW = 100000
+
+# Минимум неудачных доменов в окне, при котором поиск похожих распределяется по процессам.
+# Каждый процесс заново строит индекс, поэтому на небольших окнах поиск идет в одном процессе.
+PARALLEL_SIMILARITY_MIN = 20000
+
+# Кэш результатов резолва между запусками
+CACHE_FILE = 'hosts_cache.sqlite'
+CACHE_TTL = 3600  # Время жизни записи в секундах
+CACHE_BATCH_SIZE = 1000  # Записи сохраняются в кэш пачками по мере резолва
+
+# Альтернативные DNS серверы (Google, Cloudflare, Quad9, OpenDNS)
+GOOGLE_DNS = ['8.8.8.8', '8.8.4.4']
+CLOUDFLARE_DNS = ['1.1.1.1', '1.0.0.1']
+QUAD9_DNS = ['9.9.9.9']
+OPENDNS_DNS = ['208.67.222.222']
+
+# Пул публичных DNS серверов: запросы распределяются по хешу SLD
+RESOLVERS = [GOOGLE_DNS, CLOUDFLARE_DNS, QUAD9_DNS, OPENDNS_DNS]
+
+# Отслеживание "здоровья" серверов пула: EWMA доли отказов (таймауты, SERVFAIL).
+# Сервер, у которого EWMA превысила порог, пропускается RESOLVER_COOLDOWN секунд.
+RESOLVER_FAILURE_ALPHA = 0.2
+RESOLVER_FAILURE_THRESHOLD = 0.7
+RESOLVER_COOLDOWN = 60
+resolver_health_lock = Lock()
+resolver_health = [{'failure_rate': 0.0, 'skip_until': 0.0} for _ in RESOLVERS]
+
+
+# Резолверы dnspython создаются один раз и используются всеми потоками
+DNSPYTHON_CACHE_SIZE = 10000
+
+
+def _create_dnspython_resolver(nameservers: List[str]) -> 'dns.resolver.Resolver':
+    """Создает резолвер dnspython для серверов пула (без чтения resolv.conf, с LRU-кэшем)."""
+    resolver = dns.resolver.Resolver(configure=False)
+    resolver.nameservers = nameservers
+    resolver.cache = dns.resolver.LRUCache(DNSPYTHON_CACHE_SIZE)
+    return resolver
+
+
+DNSPYTHON_RESOLVERS = [_create_dnspython_resolver(ns) for ns in RESOLVERS] if HAS_DNSPYTHON else []
 
 
 def get_available_txt_files() -> List[str]:
@@ -90,14 +203,14 @@ def read_domains(file_path: str) -> List[str]:
     """Читает домены из файла."""
     domains = []
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
+        # Крупный буфер чтения уменьшает число системных вызовов на больших файлах
+        with open(file_path, 'r', encoding='utf-8', buffering=READ_BUFFER_SIZE) as f:
             for line in f:
                 line = line.strip()
                 # Пропускаем пустые строки и комментарии
                 if line and not line.startswith('#'):
-                    # Убираем возможные префиксы http://, https://, www.
-                    domain = line.replace('http://', '').replace('https://', '').replace('www.', '')
-                    domain = domain.split('/')[0].split(':')[0].strip()
+                    # Убираем префиксы http://, https://, www. и хвост (путь, порт)
+                    domain = _TAIL_RE.sub('', _PREFIX_RE.sub('', line)).strip()
                     if domain:
                         domains.append(domain)
     except FileNotFoundError:
@@ -110,130 +223,342 @@ def read_domains(file_path: str) -> List[str]:
     return domains
 
 
-def resolve_domain(domain: str, timeout: int = 3) -> Optional[str]:
-    """Резолвит IP-адрес домена с использованием нескольких методов."""
-    # Метод 1: Стандартный socket с таймаутом
-    try:
-        # Устанавливаем таймаут для socket операций
-        socket.setdefaulttimeout(timeout)
-        ip = socket.gethostbyname(domain)
-        return ip
-    except (socket.gaierror, socket.timeout, OSError):
-        pass
+def get_sld(domain: str) -> str:
+    """Возвращает домен второго уровня (две последние метки) в нижнем регистре."""
+    return '.'.join(domain.lower().split('.')[-2:])
+
+
+def get_resolver_order(domain: str) -> List[int]:
+    """Возвращает порядок опроса серверов пула для домена.
+    
+    Первым идет сервер, выбранный по хешу SLD (домены одного сайта попадают
+    на один сервер), остальные - по кругу. Серверы на "карантине" пропускаются.
+    """
+    start = zlib.crc32(get_sld(domain).encode('utf-8')) % len(RESOLVERS)
+    order = [(start + i) % len(RESOLVERS) for i in range(len(RESOLVERS))]
+    
+    now = time.time()
+    with resolver_health_lock:
+        healthy = [i for i in order if resolver_health[i]['skip_until'] <= now]
+    
+    # Если все серверы на карантине, опрашиваем все
+    return healthy or order
+
+
+def record_resolver_result(resolver_index: int, failed: bool):
+    """Обновляет EWMA отказов сервера пула и отправляет его на карантин при превышении порога."""
+    with resolver_health_lock:
+        health = resolver_health[resolver_index]
+        health['failure_rate'] += RESOLVER_FAILURE_ALPHA * (float(failed) - health['failure_rate'])
+        if health['failure_rate'] > RESOLVER_FAILURE_THRESHOLD:
+            health['skip_until'] = time.time() + RESOLVER_COOLDOWN
+            health['failure_rate'] = RESOLVER_FAILURE_THRESHOLD / 2
+
+
+def system_lookup(domain: str) -> Optional[str]:
+    """Резолвит домен системным резолвером (getaddrinfo).
     
-    # Метод 2: getaddrinfo с таймаутом
+    Вызов выполняется прямо в потоке-воркере: зависший запрос блокирует только
+    его. Время ожидания ограничивают настройки системного резолвера
+    (resolv.conf) - socket.setdefaulttimeout на getaddrinfo не влияет.
+    """
     try:
-        socket.setdefaulttimeout(timeout)
         result = socket.getaddrinfo(domain, None, socket.AF_INET, socket.SOCK_STREAM)
-        if result:
-            return result[0][4][0]
-    except (socket.gaierror, socket.timeout, OSError):
-        pass
+    except (OSError, UnicodeError):
+        return None
     
-    # Метод 3: Попробуем через альтернативные DNS серверы (если доступен dnspython)
-    if HAS_DNSPYTHON:
-        try:
-            resolver = dns.resolver.Resolver()
-            resolver.timeout = timeout
-            resolver.lifetime = timeout
-            
-            # Пробуем Google DNS
-            resolver.nameservers = ['8.8.8.8', '8.8.4.4']
-            answers = resolver.resolve(domain, 'A')
-            if answers:
-                return str(answers[0])
-        except:
-            pass
-        
-        try:
-            resolver = dns.resolver.Resolver()
-            resolver.timeout = timeout
-            resolver.lifetime = timeout
-            
-            # Пробуем Cloudflare DNS
-            resolver.nameservers = ['1.1.1.1', '1.0.0.1']
-            answers = resolver.resolve(domain, 'A')
-            if answers:
-                return str(answers[0])
-        except:
-            pass
+    if result:
+        return result[0][4][0]
+    return None
+
+
+def resolve_domain(domain: str, timeout: int = 3) -> Optional[str]:
+    """Резолвит IP-адрес домена с использованием нескольких методов.
     
-    # Метод 4: Попробуем через системный DNS с увеличенным таймаутом (только для важных доменов)
-    # Пропускаем для ускорения - используем только если предыдущие методы не сработали
-    # и домен выглядит важным (не тестовый)
-    if timeout > 2:  # Только если таймаут достаточно большой
-        try:
-            socket.setdefaulttimeout(timeout * 1.5)
-            ip = socket.gethostbyname(domain)
-            return ip
-        except:
-            pass
+    timeout ограничивает только запросы к пулу серверов: время системного
+    резолвера задают его собственные настройки.
+    """
+    # Метод 1: Системный резолвер (getaddrinfo)
+    ip = system_lookup(domain)
+    if ip:
+        return ip
+    
+    # Метод 2: Пул альтернативных DNS серверов (если доступен dnspython)
+    if HAS_DNSPYTHON:
+        for resolver_index in get_resolver_order(domain):
+            try:
+                # Общие резолверы не изменяются - таймаут передается в вызов
+                answers = DNSPYTHON_RESOLVERS[resolver_index].resolve(domain, 'A', lifetime=timeout)
+                record_resolver_result(resolver_index, failed=False)
+                if answers:
+                    return str(answers[0])
+            except (dns.exception.Timeout, dns.resolver.NoNameservers):
+                # Сервер недоступен - пробуем следующий
+                record_resolver_result(resolver_index, failed=True)
+            except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+                # Окончательный ответ сервера - другие серверы ответят так же
+                record_resolver_result(resolver_index, failed=False)
+                break
+            except Exception:
+                # Ошибка самого запроса (некорректное имя и т.п.) - повтор не поможет
+                break
     
     return None
 
 
-def find_similar_domains(domain: str, successful_domains: dict, max_suggestions: int = 5) -> List[Tuple[str, str, str]]:
-    """Находит похожие домены в успешных и возвращает их IP. Оптимизировано для больших списков."""
-    suggestions = []
-    domain_lower = domain.lower()
+@functools.lru_cache(maxsize=4096)
+def _split_domain(domain: str) -> Optional[Tuple[str, str]]:
+    """Разбивает домен на (базовое имя, TLD) в нижнем регистре. Для имени без точки - None."""
+    base_name, dot, tld = domain.lower().rpartition('.')
+    if not dot:
+        return None
+    return base_name, tld
+
+
+def pack_ip(ip: str) -> int:
+    """Упаковывает IPv4 адрес в int. Для некорректного адреса - OSError."""
+    return struct.unpack('!I', socket.inet_aton(ip))[0]
+
+
+def unpack_ip(packed: int) -> str:
+    """Преобразует упакованный IPv4 адрес обратно в строку."""
+    return socket.inet_ntoa(struct.pack('!I', packed))
+
+
+def _bounded_levenshtein(a, b, k: int) -> int:
+    """Расстояние Левенштейна между последовательностями a и b, если оно не больше k, иначе k + 1.
     
-    # Разбиваем домен на части
-    parts = domain_lower.split('.')
-    if len(parts) < 2:
-        return suggestions
+    Вычисляется только полоса шириной k вокруг главной диагонали (оптимизация Укконена).
+    """
+    n = len(a)
+    m = len(b)
+    limit = k + 1
+    if abs(n - m) > k:
+        return limit
     
-    base_name = '.'.join(parts[:-1])  # Все кроме TLD
-    tld = parts[-1]
+    prev = [limit] * (m + 1)
+    for j in range(min(m, k) + 1):
+        prev[j] = j
     
-    # Оптимизация: ограничиваем поиск первыми N доменами для скорости
-    # В реальности лучше использовать индексированные структуры данных
-    max_search = min(1000, len(successful_domains))  # Ограничиваем поиск
+    for i in range(1, n + 1):
+        cur = [limit] * (m + 1)
+        if i <= k:
+            cur[0] = i
+        row_min = cur[0]
+        for j in range(max(1, i - k), min(m, i + k) + 1):
+            value = prev[j - 1] + (0 if a[i - 1] == b[j - 1] else 1)
+            if prev[j] + 1 < value:
+                value = prev[j] + 1
+            if cur[j - 1] + 1 < value:
+                value = cur[j - 1] + 1
+            if value > limit:
+                value = limit
+            cur[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > k:
+            return limit
+        prev = cur
     
-    # Стратегии поиска похожих доменов
-    checked = 0
-    for success_domain, success_ip in successful_domains.items():
-        if checked >= max_search:
-            break
+    return prev[m] if prev[m] <= k else limit
+
+
+if HAS_NUMBA:
+    _bounded_levenshtein_jit = njit(cache=True)(_bounded_levenshtein)
+
+
+def bounded_levenshtein(a: str, b: str, k: int) -> int:
+    """Ограниченное расстояние Левенштейна (см. _bounded_levenshtein); с numba - JIT-версия."""
+    if HAS_NUMBA:
+        return _bounded_levenshtein_jit(np.frombuffer(a.encode('utf-8'), dtype=np.uint8),
+                                        np.frombuffer(b.encode('utf-8'), dtype=np.uint8), k)
+    return _bounded_levenshtein(a, b, k)
+
+
+class SuccessfulIndex:
+    """Индекс успешно резолвленных доменов для поиска похожих.
+    
+    by_base: базовое имя (без TLD) -> домены с этим именем;
+    by_gram: подстроки длины FRAGMENT_GRAM со смещений 0..MAX_FRAGMENT_DIFF -> базовые имена
+    (не больше MAX_FRAGMENT_DIFF + 1 записей на имя), кандидаты для поиска по префиксу и вхождению;
+    by_shape: (первый символ, длина) -> базовые имена, кандидаты для нечеткого сравнения.
+    """
+    
+    MAX_PREFIX_DIFF = 3
+    MAX_FRAGMENT_DIFF = 5
+    FRAGMENT_GRAM = 3
+    MAX_EDIT_DISTANCE = 2
+    MAX_FUZZY_CANDIDATES = 200
+    
+    def __init__(self):
+        self.domains = {}  # домен -> IP, упакованный в int (см. pack_ip)
+        self.by_base = {}
+        self.by_gram = {}
+        self.by_shape = {}  # (первый символ, длина) -> базовые имена
+    
+    def __len__(self) -> int:
+        return len(self.domains)
+    
+    @classmethod
+    def from_domains(cls, domains: dict) -> 'SuccessfulIndex':
+        """Строит индекс из словаря {домен: упакованный IP} (см. SuccessfulIndex.domains)."""
+        index = cls()
+        for domain, packed in domains.items():
+            index._insert(domain, packed)
+        return index
+    
+    def add(self, domain: str, ip: str):
+        """Добавляет успешно резолвленный домен в индекс. Некорректные IPv4 пропускаются."""
+        try:
+            packed = pack_ip(ip)
+        except OSError:
+            return
+        self._insert(domain, packed)
+    
+    def _insert(self, domain: str, packed: int):
+        known = domain in self.domains
+        self.domains[domain] = packed
+        split = _split_domain(domain)
+        if known or split is None:
+            return
         
-        checked += 1
-        success_domain_lower = success_domain.lower()
-        success_parts = success_domain_lower.split('.')
+        base_name = split[0]
+        domains = self.by_base.get(base_name)
+        if domains is not None:
+            domains.append(domain)
+            return
+        self.by_base[base_name] = [domain]
         
-        if len(success_parts) < 2:
-            continue
+        for gram in self._grams(base_name):
+            self.by_gram.setdefault(gram, []).append(base_name)
         
-        success_base = '.'.join(success_parts[:-1])
-        success_tld = success_parts[-1]
+        if base_name:
+            self.by_shape.setdefault((base_name[0], len(base_name)), []).append(base_name)
+    
+    @classmethod
+    def _fragments(cls, base_name: str) -> List[str]:
+        """Непустые подстроки base_name, короче его не больше чем на MAX_FRAGMENT_DIFF символов."""
+        length = len(base_name)
+        return [base_name[start:end]
+                for start in range(min(cls.MAX_FRAGMENT_DIFF, length - 1) + 1)
+                for end in range(length, max(start, length - cls.MAX_FRAGMENT_DIFF + start - 1), -1)]
+    
+    @classmethod
+    def _grams(cls, base_name: str) -> List[str]:
+        """Уникальные подстроки длины FRAGMENT_GRAM, начинающиеся на смещениях 0..MAX_FRAGMENT_DIFF.
         
-        # Стратегия 1: Тот же базовый домен, другой TLD (высокий приоритет)
-        if base_name == success_base and tld != success_tld:
-            suggestions.insert(0, (success_domain, success_ip, 'разный TLD'))  # Добавляем в начало
-            if len(suggestions) >= max_suggestions:
-                return suggestions[:max_suggestions]
-        
-        # Стратегия 2: Похожий базовый домен (разница в 1-3 символа)
-        elif base_name != success_base and len(suggestions) < max_suggestions:
-            # Проверяем, начинается ли один с другого
-            if (base_name.startswith(success_base) or success_base.startswith(base_name)) and \
-               abs(len(base_name) - len(success_base)) <= 3:
-                suggestions.append((success_domain, success_ip, 'похожее имя'))
-                if len(suggestions) >= max_suggestions:
-                    return suggestions[:max_suggestions]
-            
-            # Проверяем частичное совпадение (один домен содержит другой)
-            elif abs(len(base_name) - len(success_base)) <= 5:
-                if base_name in success_base or success_base in base_name:
-                    suggestions.append((success_domain, success_ip, 'частичное совпадение'))
-                    if len(suggestions) >= max_suggestions:
-                        return suggestions[:max_suggestions]
+        Имя, содержащее запрос, содержит его со смещения не больше MAX_FRAGMENT_DIFF,
+        поэтому начало запроса всегда совпадает с одной из этих подстрок.
+        """
+        last_start = min(cls.MAX_FRAGMENT_DIFF, len(base_name) - cls.FRAGMENT_GRAM)
+        return list(dict.fromkeys(base_name[start:start + cls.FRAGMENT_GRAM]
+                                  for start in range(last_start + 1)))
+    
+    def _containing_candidates(self, base_name: str):
+        """Базовые имена, которые могут содержать base_name со смещения до MAX_FRAGMENT_DIFF."""
+        if len(base_name) >= self.FRAGMENT_GRAM:
+            return self.by_gram.get(base_name[:self.FRAGMENT_GRAM], ())
+        # Имена короче FRAGMENT_GRAM (редкость) - перебор всех базовых имен
+        return self.by_base
+    
+    def prefix_related(self, base_name: str) -> List[str]:
+        """Базовые имена, которые являются префиксом base_name или начинаются с него
+        (разница в длине не больше MAX_PREFIX_DIFF)."""
+        length = len(base_name)
+        
+        # Короче: префиксы base_name ищутся в by_base напрямую
+        related = [base_name[:end] for end in range(max(1, length - self.MAX_PREFIX_DIFF), length)
+                   if base_name[:end] in self.by_base]
+        
+        # Длиннее: имена, начинающиеся с base_name, - среди кандидатов по вхождению
+        max_length = length + self.MAX_PREFIX_DIFF
+        related += [other for other in self._containing_candidates(base_name)
+                    if length < len(other) <= max_length and other.startswith(base_name)]
+        return related
     
-    return suggestions[:max_suggestions]
+    def fragment_related(self, base_name: str) -> List[str]:
+        """Базовые имена, которые содержат base_name или содержатся в нем
+        (разница в длине не больше MAX_FRAGMENT_DIFF)."""
+        if not base_name:
+            return []
+        length = len(base_name)
+        max_length = length + self.MAX_FRAGMENT_DIFF
+        related = [other for other in self._containing_candidates(base_name)
+                   if length < len(other) <= max_length and base_name in other]
+        
+        for fragment in self._fragments(base_name):
+            if fragment != base_name and fragment in self.by_base:
+                related.append(fragment)
+        return related
+    
+    def fuzzy_related(self, base_name: str) -> List[str]:
+        """Базовые имена на расстоянии Левенштейна не больше MAX_EDIT_DISTANCE (опечатки).
+        
+        Сравниваются только имена с тем же первым символом и близкой длиной,
+        не больше MAX_FUZZY_CANDIDATES штук.
+        """
+        if not base_name:
+            return []
+        
+        related = []
+        checked = 0
+        length = len(base_name)
+        k = self.MAX_EDIT_DISTANCE
+        for other_length in range(max(1, length - k), length + k + 1):
+            for other in self.by_shape.get((base_name[0], other_length), ()):
+                if checked >= self.MAX_FUZZY_CANDIDATES:
+                    return related
+                checked += 1
+                if other != base_name and bounded_levenshtein(base_name, other, k) <= k:
+                    related.append(other)
+        return related
 
 
+def find_similar_domains(domain: str, index: SuccessfulIndex, max_suggestions: int = 5) -> List[Tuple[str, int, str]]:
+    """Находит похожие домены в индексе успешных и возвращает их IP (упакованные, см. unpack_ip)."""
+    suggestions = []
+    
+    split = _split_domain(domain)
+    if split is None:
+        return suggestions
+    base_name, tld = split
+    
+    # Стратегия 1: Тот же базовый домен, другой TLD (высокий приоритет)
+    for success_domain in index.by_base.get(base_name, ()):
+        if _split_domain(success_domain)[1] != tld:
+            suggestions.append((success_domain, index.domains[success_domain], 'разный TLD'))
+            if len(suggestions) >= max_suggestions:
+                return suggestions
+    
+    # Стратегия 2: Похожий базовый домен (один начинается с другого, разница в 1-3 символа)
+    # Стратегия 3: Частичное совпадение (один домен содержит другой)
+    # Стратегия 4: Опечатка (расстояние Левенштейна до 2), только если остальные не нашли достаточно
+    seen_bases = {base_name}
+    strategies = (
+        (index.prefix_related, 'похожее имя'),
+        (index.fragment_related, 'частичное совпадение'),
+        (index.fuzzy_related, 'опечатка'),
+    )
+    for find_related, reason in strategies:
+        for success_base in find_related(base_name):
+            if success_base in seen_bases:
+                continue
+            seen_bases.add(success_base)
+            for success_domain in index.by_base[success_base]:
+                suggestions.append((success_domain, index.domains[success_domain], reason))
+                if len(suggestions) >= max_suggestions:
+                    return suggestions
+    
+    return suggestions
 
 
 def try_domain_variants(domain: str, timeout: int) -> Optional[str]:
-    """Пробует резолвить варианты домена (разные TLD, без поддоменов)."""
+    """Пробует резолвить варианты домена (разные TLD, без поддоменов).
+    
+    Все запросы отправляются разом через один неблокирующий UDP сокет серверу
+    пула, ответы собираются через select - варианты проверяются за один RTT.
+    Возвращается первый полученный IP.
+    """
     parts = domain.split('.')
     if len(parts) < 2:
         return None
@@ -241,87 +566,910 @@ def try_domain_variants(domain: str, timeout: int) -> Optional[str]:
     base_name = '.'.join(parts[:-1])
     original_tld = parts[-1]
     
-    # Популярные TLD для попытки
-    common_tlds = ['com', 'net', 'org', 'ru', 'io', 'co', 'info', 'top', 'xyz', 'site']
+    try:
+        base_wire = encode_dns_labels(base_name)
+        # Вопросы с разными TLD собираются из заранее закодированных хвостов
+        questions = [base_wire + TLD_QUESTIONS[tld] for tld in COMMON_TLDS if tld != original_tld]
+        # Без поддоменов (если есть)
+        if len(parts) > 2:
+            questions.append(encode_dns_labels(f"{parts[-2]}.{parts[-1]}") + b'\x00' + DNS_QUESTION_A_IN)
+    except ValueError:
+        return None
     
-    # Пробуем резолвить с разными TLD
-    for tld in common_tlds:
-        if tld == original_tld:
-            continue
-        
-        variant = f"{base_name}.{tld}"
-        try:
-            ip = resolve_domain(variant, timeout=1)  # Быстрый таймаут для вариантов
-            if ip:
-                return ip
-        except:
-            continue
+    resolver_index = get_resolver_order(domain)[0]
+    nameserver = RESOLVERS[resolver_index][0]
+    txids = random.sample(range(0x10000), len(questions))
+    pending = set(txids)
     
-    # Пробуем без поддоменов (если есть)
-    if len(parts) > 2:
-        # Берем только основной домен и TLD
-        main_domain = f"{parts[-2]}.{parts[-1]}"
-        try:
-            ip = resolve_domain(main_domain, timeout=1)
-            if ip:
-                return ip
-        except:
-            pass
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setblocking(False)
+        for txid, question in zip(txids, questions):
+            sock.sendto(encode_dns_header(txid) + question, (nameserver, DNS_PORT))
+        
+        deadline = time.monotonic() + timeout
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            readable, _, _ = select.select([sock], [], [], remaining)
+            if not readable:
+                break
+            try:
+                data, addr = sock.recvfrom(4096)
+                txid, flags, answers = parse_dns_response(data)
+            except (OSError, struct.error, IndexError):
+                continue  # ICMP ошибка или битый пакет
+            if txid not in pending or addr[0] != nameserver:
+                continue
+            pending.discard(txid)
+            if flags & 0x0F == 0 and answers:
+                record_resolver_result(resolver_index, failed=False)
+                return answers[0].host
+    except OSError:
+        return None
+    finally:
+        sock.close()
     
+    # Сервер не ответил ни на один запрос - учитываем как отказ
+    record_resolver_result(resolver_index, failed=len(pending) == len(questions))
     return None
 
 
-def resolve_domain_wrapper(args: Tuple[str, int, int, dict, Lock]) -> Tuple[str, Optional[str], int]:
-    """Обертка для резолва домена с индексом для сохранения порядка."""
-    domain, timeout, index, successful_domains, successful_lock = args
+def resolve_domain_wrapper(args: Tuple[str, int, int, SuccessfulIndex, Lock]) -> Tuple[str, Optional[str], int]:
+    """Обертка для резолва домена с индексом для сохранения порядка.
+    
+    Поиск похожих и вариантов для неудачных доменов выполняется отдельным
+    проходом после резолва (см. resolve_failed_domains).
+    """
+    domain, timeout, index, successful_index, successful_lock = args
     
-    # Сначала пробуем стандартный резолв
     ip = resolve_domain(domain, timeout)
     
-    # Если получилось, добавляем в словарь успешных доменов
+    # Если получилось, добавляем в индекс успешных доменов
     if ip:
         with successful_lock:
-            successful_domains[domain] = ip
+            successful_index.add(domain, ip)
     
-    # Если не получилось и включен поиск похожих, пробуем найти похожий домен
-    if not ip:
-        # Блокируем доступ к словарю для чтения
-        with successful_lock:
-            # Создаем копию словаря для безопасного чтения
-            successful_copy = dict(successful_domains)
+    return (domain, ip, index)
+
+
+class DnsQueryError(Exception):
+    """Ошибка DNS запроса встроенного клиента (NXDOMAIN, SERVFAIL, нет A-записей)."""
+
+
+class DnsServerError(DnsQueryError):
+    """Сервер не ответил за отведенное время или вернул SERVFAIL/REFUSED."""
+
+
+class DnsConnectionClosed(DnsServerError):
+    """TCP соединение с DNS сервером закрылось, не дождавшись ответа на запрос.
+    
+    progressed: соединение успело ответить хотя бы на один запрос (сервер жив
+    и просто закрывает соединения, запрос стоит повторить).
+    """
+    
+    def __init__(self, message: str, progressed: bool):
+        super().__init__(message)
+        self.progressed = progressed
+
+
+class DnsAnswer(NamedTuple):
+    """A-запись из DNS ответа (совместима с результатом aiodns)."""
+    host: str
+    ttl: int
+
+
+def encode_dns_labels(name: str) -> bytes:
+    """Кодирует имя в формат меток DNS (длина + байты метки) без завершающего нуля."""
+    wire = bytearray()
+    for label in name.rstrip('.').encode('idna').split(b'.'):
+        if not 0 < len(label) < 64:
+            raise ValueError(f"Некорректная метка домена: {name}")
+        wire.append(len(label))
+        wire += label
+    return bytes(wire)
+
+
+def encode_dns_header(txid: int) -> bytes:
+    """Заголовок DNS запроса. Флаги 0x0100: рекурсивный запрос (RD), один вопрос."""
+    return struct.pack('!HHHHHH', txid, 0x0100, 1, 0, 0, 0)
+
+
+def encode_dns_query(txid: int, domain: str) -> bytes:
+    """Кодирует DNS запрос A/IN: 12-байтовый заголовок + QNAME + QTYPE + QCLASS."""
+    return encode_dns_header(txid) + encode_dns_labels(domain) + b'\x00' + DNS_QUESTION_A_IN
+
+
+def _skip_dns_name(data: bytes, offset: int) -> int:
+    """Пропускает имя в DNS сообщении (с учетом сжатия) и возвращает новое смещение."""
+    while True:
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        offset += 1
+        if length == 0:
+            return offset
+        offset += length
+
+
+def parse_dns_response(data: bytes) -> Tuple[int, int, List[DnsAnswer]]:
+    """Разбирает DNS ответ. Возвращает (ID транзакции, флаги, список A-записей)."""
+    txid, flags, qdcount, ancount = struct.unpack_from('!HHHH', data)
+    offset = 12
+    
+    for _ in range(qdcount):
+        offset = _skip_dns_name(data, offset) + 4
+    
+    answers = []
+    for _ in range(ancount):
+        offset = _skip_dns_name(data, offset)
+        rtype, rclass, ttl, rdlength = struct.unpack_from('!HHIH', data, offset)
+        offset += 10
+        if rtype == 1 and rclass == 1 and rdlength == 4:
+            answers.append(DnsAnswer(socket.inet_ntoa(data[offset:offset + 4]), ttl))
+        offset += rdlength
+    
+    return txid, flags, answers
+
+
+def check_dns_answers(host: str, flags: int, answers: List[DnsAnswer]) -> List[DnsAnswer]:
+    """Проверяет код ответа DNS и возвращает A-записи или выбрасывает DnsQueryError."""
+    rcode = flags & 0x0F
+    if rcode in (2, 5):  # SERVFAIL, REFUSED
+        raise DnsServerError(f"Сервер отказал в запросе {host} (rcode={rcode})")
+    if rcode != 0 or not answers:
+        raise DnsQueryError(f"Нет A-записей для {host} (rcode={rcode})")
+    return answers
+
+
+class _DnsDatagramProtocol(asyncio.DatagramProtocol):
+    """Принимает DNS ответы на общем UDP сокете и передает их резолверу."""
+    
+    def __init__(self, resolver: 'UdpDnsResolver'):
+        self.resolver = resolver
+    
+    def datagram_received(self, data: bytes, addr):
+        self.resolver._on_response(data, addr)
+    
+    def error_received(self, exc: Exception):
+        # ICMP ошибки (например, порт недоступен) - ответ просто не придет, сработает таймаут
+        pass
+
+
+class UdpDnsResolver:
+    """Асинхронный DNS клиент без внешних зависимостей.
+    
+    Все запросы идут через один UDP сокет, зарегистрированный в цикле событий
+    (epoll/uvloop): отправка не блокирует, ответы сопоставляются с запросами
+    по ID транзакции. Интерфейс совместим с aiodns.DNSResolver.query().
+    """
+    
+    def __init__(self, nameservers: List[str], timeout: float):
+        self.nameservers = nameservers
+        self.timeout = timeout
+        self._transport = None
+        self._transport_lock = None
+        self._pending = {}  # ID транзакции -> (future, ожидаемые адреса серверов)
+    
+    async def _get_transport(self):
+        if self._transport is not None:
+            return self._transport
+        if self._transport_lock is None:
+            self._transport_lock = asyncio.Lock()
+        # Первые запросы приходят пачкой: сокет создает только один из них
+        async with self._transport_lock:
+            if self._transport is None:
+                loop = asyncio.get_running_loop()
+                self._transport, _ = await loop.create_datagram_endpoint(
+                    lambda: _DnsDatagramProtocol(self), family=socket.AF_INET)
+        return self._transport
+    
+    def _on_response(self, data: bytes, addr):
+        try:
+            txid, flags, answers = parse_dns_response(data)
+        except (struct.error, IndexError):
+            return  # Битый пакет - игнорируем
+        
+        entry = self._pending.get(txid)
+        if entry is None:
+            return
+        future, servers = entry
+        # Принимаем ответ только от сервера, которому отправляли запрос
+        if addr[0] in servers and not future.done():
+            future.set_result((flags, answers))
+    
+    def _new_txid(self) -> int:
+        while True:
+            txid = random.getrandbits(16)
+            if txid not in self._pending:
+                return txid
+    
+    async def query(self, host: str, qtype: str = 'A') -> List[DnsAnswer]:
+        """Выполняет A-запрос, по очереди пробуя серверы из nameservers."""
+        if qtype != 'A':
+            raise ValueError(f"Неподдерживаемый тип запроса: {qtype}")
         
-        # Ищем похожие домены в уже успешно резолвленных
-        similar = find_similar_domains(domain, successful_copy, max_suggestions=3)
+        transport = await self._get_transport()
+        txid = self._new_txid()
+        packet = encode_dns_query(txid, host)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[txid] = (future, set(self.nameservers))
         
-        if similar:
-            # Пробуем использовать IP похожих доменов
-            for similar_domain, similar_ip, reason in similar:
-                # Проверяем, что IP валидный
+        # Таймаут делится между серверами, как в c-ares
+        attempt_timeout = self.timeout / len(self.nameservers)
+        try:
+            for nameserver in self.nameservers:
+                transport.sendto(packet, (nameserver, DNS_PORT))
                 try:
-                    socket.inet_aton(similar_ip)
-                    ip = similar_ip
-                    break  # Используем первый найденный валидный IP
-                except:
+                    # shield: поздний ответ от предыдущего сервера тоже будет принят
+                    flags, answers = await asyncio.wait_for(asyncio.shield(future), attempt_timeout)
+                    break
+                except asyncio.TimeoutError:
                     continue
+            else:
+                raise DnsServerError(f"Таймаут запроса {host}")
+        finally:
+            self._pending.pop(txid, None)
         
-        # Если все еще не нашли, пробуем варианты домена (разные TLD)
-        if not ip:
-            ip = try_domain_variants(domain, timeout=1)
+        return check_dns_answers(host, flags, answers)
+    
+    def close(self):
+        """Закрывает UDP сокет."""
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+
+class _DnsTcpConnection:
+    """TCP соединение с DNS сервером с конвейерной отправкой запросов (RFC 7766).
+    
+    Запросы пишутся в поток без ожидания ответов, отдельная задача читает
+    ответы и сопоставляет их с запросами по ID транзакции. Закрытое сервером
+    соединение (простой, лимит запросов) переоткрывается при следующем запросе.
+    Собственных таймаутов нет: время запроса ограничивает вызывающий код
+    (resolve_async), иначе вложенный wait_for мог бы проглотить отмену.
+    Неотвеченных запросов в соединении не больше TCP_MAX_PIPELINED.
+    """
+    
+    def __init__(self, nameservers: List[str]):
+        self.nameservers = nameservers
+        self._writer = None
+        self._pending = None  # ID транзакции -> future; свой словарь у каждого соединения
+        self._reader_task = None
+        self._connect_lock = None
+        self._pipeline_slots = None
+    
+    async def _connect(self):
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is None or self._writer.is_closing():
+                last_error = None
+                for nameserver in self.nameservers:
+                    try:
+                        reader, writer = await asyncio.open_connection(nameserver, DNS_PORT)
+                        break
+                    except OSError as e:
+                        last_error = e
+                else:
+                    raise DnsServerError(f"Не удалось подключиться к {self.nameservers}: {last_error}")
+                self._writer = writer
+                self._pending = {}
+                self._reader_task = asyncio.ensure_future(
+                    self._read_responses(reader, writer, self._pending))
+        return self._writer, self._pending
+    
+    async def _read_responses(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                              pending: dict):
+        answered = 0
+        try:
+            while True:
+                # Каждое сообщение предваряется 2-байтовой длиной
+                length, = struct.unpack('!H', await reader.readexactly(2))
+                data = await reader.readexactly(length)
+                try:
+                    txid, flags, answers = parse_dns_response(data)
+                except (struct.error, IndexError):
+                    continue  # Битый ответ - запрос завершится по таймауту
+                future = pending.get(txid)
+                if future is not None and not future.done():
+                    future.set_result((flags, answers))
+                    answered += 1
+        except (asyncio.IncompleteReadError, OSError):
+            pass
+        finally:
+            writer.close()
+            # Запросы, оставшиеся без ответа на этом соединении, завершаем ошибкой сервера
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(DnsConnectionClosed("Соединение закрыто сервером", answered > 0))
+    
+    async def query(self, host: str, qtype: str = 'A') -> List[DnsAnswer]:
+        """Отправляет A-запрос в соединение и ждет ответа с тем же ID транзакции."""
+        if qtype != 'A':
+            raise ValueError(f"Неподдерживаемый тип запроса: {qtype}")
+        
+        question = encode_dns_labels(host)
+        if self._pipeline_slots is None:
+            self._pipeline_slots = asyncio.Semaphore(TCP_MAX_PIPELINED)
+        
+        async with self._pipeline_slots:
+            # Сервер может закрыть соединение с неотвеченными запросами - запрос
+            # повторяется в новом соединении, пока соединения продвигаются (RFC 7766)
+            while True:
+                writer, pending = await self._connect()
+                txid = random.getrandbits(16)
+                while txid in pending:
+                    txid = random.getrandbits(16)
+                packet = encode_dns_header(txid) + question + b'\x00' + DNS_QUESTION_A_IN
+                future = asyncio.get_running_loop().create_future()
+                pending[txid] = future
+                
+                try:
+                    writer.write(struct.pack('!H', len(packet)) + packet)
+                    try:
+                        await writer.drain()
+                    except OSError:
+                        pass  # Соединение оборвалось - запрос завершит задача чтения ответов
+                    flags, answers = await future
+                    break
+                except DnsConnectionClosed as e:
+                    if not e.progressed:
+                        raise
+                finally:
+                    pending.pop(txid, None)
+        
+        return check_dns_answers(host, flags, answers)
+    
+    def close(self):
+        """Закрывает соединение и останавливает чтение ответов."""
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class TcpDnsResolver:
+    """Асинхронный DNS клиент поверх TCP без внешних зависимостей.
+    
+    Держит TCP_CONNECTIONS_PER_SERVER соединений и распределяет по ним запросы
+    по хешу SLD. Одно рукопожатие на множество запросов и никаких обрезанных
+    (TC) ответов, как у UDP. Интерфейс совместим с aiodns.DNSResolver.query();
+    таймаут задается вызывающим кодом (см. resolve_async).
+    """
+    
+    def __init__(self, nameservers: List[str]):
+        self.connections = [_DnsTcpConnection(nameservers)
+                            for _ in range(TCP_CONNECTIONS_PER_SERVER)]
     
-    # Обновляем счетчики
-    with progress_lock:
-        progress_counter['total'] += 1
+    async def query(self, host: str, qtype: str = 'A') -> List[DnsAnswer]:
+        """Выполняет A-запрос через соединение, закрепленное за SLD домена."""
+        # hash(), а не crc32: по crc32 SLD уже выбирается сервер (get_resolver_order),
+        # и одинаковый остаток загрузил бы на каждом сервере только одно соединение
+        connection = self.connections[hash(get_sld(host)) % len(self.connections)]
+        return await connection.query(host, qtype)
+    
+    def close(self):
+        """Закрывает все соединения."""
+        for connection in self.connections:
+            connection.close()
+
+
+def get_system_nameservers() -> List[str]:
+    """Читает IPv4 DNS серверы из /etc/resolv.conf (если нет - Google DNS)."""
+    nameservers = []
+    try:
+        with open('/etc/resolv.conf', 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == 'nameserver':
+                    try:
+                        socket.inet_aton(parts[1])
+                        nameservers.append(parts[1])
+                    except OSError:
+                        continue  # IPv6 сервер - UDP сокет клиента только IPv4
+    except OSError:
+        pass
+    
+    return nameservers or list(GOOGLE_DNS)
+
+
+# Ошибки резолва, которые означают "домен не резолвится"
+if HAS_AIODNS:
+    ASYNC_DNS_ERRORS = (DnsQueryError, aiodns.error.DNSError)
+    # Коды c-ares, означающие проблему на стороне сервера
+    AIODNS_SERVER_ERRORS = {
+        aiodns.error.ARES_ETIMEOUT,
+        aiodns.error.ARES_ESERVFAIL,
+        aiodns.error.ARES_EREFUSED,
+        aiodns.error.ARES_ECONNREFUSED,
+    }
+else:
+    ASYNC_DNS_ERRORS = (DnsQueryError,)
+    AIODNS_SERVER_ERRORS = set()
+
+
+def is_server_error(error: Exception) -> bool:
+    """Проверяет, вызвана ли ошибка резолва отказом сервера, а не отсутствием домена."""
+    if isinstance(error, (asyncio.TimeoutError, DnsServerError, OSError)):
+        return True
+    return bool(error.args) and error.args[0] in AIODNS_SERVER_ERRORS
+
+
+async def resolve_async(domain: str, resolver, timeout: float,
+                        resolver_index: Optional[int] = None) -> Tuple[Optional[str], bool]:
+    """Асинхронно резолвит A-запись домена через указанный резолвер.
+    
+    Возвращает (IP или None, отказ сервера): второй элемент True, если ответа
+    нет из-за сервера (таймаут, SERVFAIL), а не из-за отсутствия домена.
+    Если передан resolver_index, результат учитывается в статистике сервера пула.
+    """
+    ip = None
+    failed = False
+    try:
+        answers = await asyncio.wait_for(resolver.query(domain, 'A'), timeout)
+        if answers:
+            ip = answers[0].host
+    except ASYNC_DNS_ERRORS + (asyncio.TimeoutError, OSError) as e:
+        # OSError: сокет недоступен (нет сети, исчерпаны дескрипторы) - отказ, а не падение прогона
+        failed = is_server_error(e)
+    except ValueError:
+        pass  # Некорректное имя домена
+    
+    if resolver_index is not None:
+        record_resolver_result(resolver_index, failed)
+    return ip, failed
+
+
+class AsyncResolvers:
+    """Набор асинхронных резолверов: системный и по одному на каждый сервер пула RESOLVERS.
+    
+    Используется aiodns, если установлен, иначе встроенный UdpDnsResolver.
+    С use_tcp=True серверы пула опрашиваются через TcpDnsResolver.
+    """
+    
+    def __init__(self, timeout: float, use_tcp: bool = False):
+        if HAS_AIODNS:
+            self.system = aiodns.DNSResolver(timeout=timeout)
+        else:
+            self.system = UdpDnsResolver(get_system_nameservers(), timeout)
+        
+        if use_tcp:
+            self.pool = [TcpDnsResolver(ns) for ns in RESOLVERS]
+        elif HAS_AIODNS:
+            self.pool = [aiodns.DNSResolver(nameservers=ns, timeout=timeout) for ns in RESOLVERS]
+        else:
+            self.pool = [UdpDnsResolver(ns, timeout) for ns in RESOLVERS]
+    
+    def close(self):
+        """Освобождает сокеты резолверов."""
+        for resolver in [self.system] + self.pool:
+            close = getattr(resolver, 'close', None)
+            if close is not None:
+                close()
+
+
+async def race_resolve(domain: str, resolvers: AsyncResolvers, timeout: float) -> Optional[str]:
+    """Резолвит домен "наперегонки" (в стиле Happy Eyeballs).
+    
+    Запрос к системному DNS и, через RACE_STAGGER секунд, к серверу пула,
+    выбранному по хешу SLD; берется первый успешный ответ, второй запрос
+    отменяется (или даже не отправляется, если системный DNS успел ответить).
+    Остальные серверы пула опрашиваются по очереди, только если выбранный
+    сервер отказал (таймаут, SERVFAIL) - NXDOMAIN окончательный.
+    """
+    order = get_resolver_order(domain)
+    
+    async def attempt_pool(resolver_index: int) -> Tuple[Optional[str], bool]:
+        await asyncio.sleep(RACE_STAGGER)
+        return await resolve_async(domain, resolvers.pool[resolver_index], timeout, resolver_index)
+    
+    system_task = asyncio.ensure_future(resolve_async(domain, resolvers.system, timeout))
+    pool_task = asyncio.ensure_future(attempt_pool(order[0]))
+    pending = {system_task, pool_task}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                ip, _ = task.result()
+                if ip:
+                    return ip
+    finally:
+        # Отменяем проигравший запрос
+        for task in pending:
+            task.cancel()
+    
+    _, server_failed = pool_task.result()
+    for resolver_index in order[1:]:
+        if not server_failed:
+            break
+        ip, server_failed = await resolve_async(domain, resolvers.pool[resolver_index], timeout, resolver_index)
+        if ip:
+            return ip
+    return None
+
+
+async def try_domain_variants_async(domain: str, resolvers: AsyncResolvers) -> Optional[str]:
+    """Асинхронный аналог try_domain_variants: все варианты опрашиваются параллельно.
+    
+    Возвращается первый полученный IP, остальные запросы отменяются.
+    """
+    parts = domain.split('.')
+    if len(parts) < 2:
+        return None
+    
+    base_name = '.'.join(parts[:-1])
+    original_tld = parts[-1]
+    
+    # Варианты с разными TLD и без поддоменов (если есть)
+    variants = [f"{base_name}.{tld}" for tld in COMMON_TLDS if tld != original_tld]
+    if len(parts) > 2:
+        variants.append(f"{parts[-2]}.{parts[-1]}")
+    
+    async def probe(variant: str) -> Optional[str]:
+        # По одному запросу на вариант - к серверу пула, выбранному по хешу SLD
+        resolver_index = get_resolver_order(variant)[0]
+        ip, _ = await resolve_async(variant, resolvers.pool[resolver_index], 1, resolver_index)
+        return ip
+    
+    tasks = [asyncio.ensure_future(probe(variant)) for variant in variants]
+    try:
+        for future in asyncio.as_completed(tasks):
+            ip = await future
+            if ip:
+                return ip
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def resolve_domain_wrapper_async(domain: str, timeout: float, index: int,
+                                       successful_index: SuccessfulIndex, resolvers: AsyncResolvers,
+                                       semaphore: asyncio.Semaphore) -> Tuple[str, Optional[str], int, bool]:
+    """Асинхронная обертка для резолва домена с индексом для сохранения порядка.
+    
+    Возвращает (домен, IP, индекс, direct); direct=False, если IP подобран
+    по похожему домену или варианту TLD, а не получен резолвом самого домена.
+    """
+    async with semaphore:
+        ip = await race_resolve(domain, resolvers, timeout)
+        direct = ip is not None
+        
         if ip:
-            progress_counter['success'] += 1
+            # Цикл событий однопоточный, блокировка не нужна
+            successful_index.add(domain, ip)
         else:
-            progress_counter['failed'] += 1
+            # Ищем похожие домены в уже успешно резолвленных
+            similar = find_similar_domains(domain, successful_index, max_suggestions=1)
+            if similar:
+                # IP в индексе уже проверены при добавлении - берем первый
+                ip = unpack_ip(similar[0][1])
+            
+            # Если все еще не нашли, пробуем варианты домена (разные TLD)
+            if not ip:
+                ip = await try_domain_variants_async(domain, resolvers)
     
-    return (domain, ip, index)
+    return (domain, ip, index, direct)
+
+
+class ResolveProgress:
+    """Отображение прогресса резолва: прогресс-бар tqdm или периодический вывод.
+    
+    Счетчики ведет только поток, разбирающий результаты, поэтому блокировка не нужна.
+    """
+    
+    def __init__(self, total: int, start_time: float):
+        self.total = total
+        self.start_time = start_time
+        self.completed = 0
+        self.success = 0
+        self.failed = 0
+        self.last_print = 0
+        self.print_interval = max(1, total // 100)  # Печатаем каждые 1% или минимум каждый домен
+        self.pbar = tqdm(total=total, desc="Резолв доменов", unit="домен") if HAS_TQDM else None
+    
+    def update(self, ip: Optional[str]):
+        """Отмечает завершение резолва одного домена."""
+        self.completed += 1
+        if ip:
+            self.success += 1
+        else:
+            self.failed += 1
+        
+        if self.pbar is not None:
+            self.pbar.update(1)
+            
+            # Обновляем описание прогресс-бара
+            elapsed = time.time() - self.start_time
+            rate = self.completed / elapsed if elapsed > 0 else 0
+            self.pbar.set_postfix({
+                '✓': self.success,
+                '✗': self.failed,
+                'скорость': f'{rate:.1f}/с'
+            })
+            return
+        
+        # Без прогресс-бара - периодически выводим прогресс
+        completed = self.completed
+        if completed - self.last_print >= self.print_interval or completed == self.total:
+            elapsed = time.time() - self.start_time
+            rate = completed / elapsed if elapsed > 0 else 0
+            remaining = self.total - completed
+            eta = remaining / rate if rate > 0 else 0
+            print(f"  Прогресс: {completed}/{self.total} ({completed/self.total*100:.1f}%) | "
+                  f"✓ {self.success} ✗ {self.failed} | "
+                  f"{rate:.1f} домен/с | "
+                  f"Осталось: ~{eta:.0f}с", end='\r', flush=True)
+            self.last_print = completed
+    
+    def close(self):
+        """Завершает вывод прогресса."""
+        if self.pbar is not None:
+            self.pbar.close()
+        else:
+            print()  # Новая строка после завершения
+
+
+def group_by_sld(domains: List[str], indices: range) -> Tuple[dict, List[int]]:
+    """Группирует домены с индексами из indices по SLD.
+    
+    Возвращает {SLD: индекс первого домена группы (представителя)} и индексы
+    остальных доменов, которые резолвятся после представителей.
+    """
+    representatives = {}
+    rest = []
+    for i in indices:
+        sld = get_sld(domains[i])
+        if sld in representatives:
+            rest.append(i)
+        else:
+            representatives[sld] = i
+    return representatives, rest
+
+
+def seed_sld_representatives(successful_index: SuccessfulIndex, domains: List[str],
+                             representative_ips: dict, representatives: dict, rest: List[int]):
+    """Добавляет SLD групп с IP их представителя в индекс успешных доменов.
+    
+    representative_ips: {индекс представителя: IP}. Так поиск похожих для
+    поддоменов той же группы сразу находит вариант.
+    """
+    for sld in {get_sld(domains[i]) for i in rest}:
+        representative = representatives[sld]
+        ip = representative_ips[representative]
+        if ip and sld != domains[representative].lower():
+            successful_index.add(sld, ip)
+
+
+# Индекс успешных доменов в процессе-воркере поиска похожих
+_worker_index = None
+
+
+def _load_index(snapshot: bytes):
+    """Инициализатор процесса-воркера: один раз строит индекс из снимка."""
+    global _worker_index
+    _worker_index = SuccessfulIndex.from_domains(pickle.loads(snapshot))
+
+
+def _find_similar_chunk(domains: List[str]) -> List[Optional[int]]:
+    """Ищет похожий домен для каждого домена порции. Возвращает упакованные IP или None."""
+    packed_ips = []
+    for domain in domains:
+        similar = find_similar_domains(domain, _worker_index, max_suggestions=1)
+        packed_ips.append(similar[0][1] if similar else None)
+    return packed_ips
+
+
+def find_similar_ips(domains: List[str], successful_index: SuccessfulIndex) -> List[Optional[str]]:
+    """Подбирает IP похожих успешных доменов для списка неудачных доменов.
+    
+    На больших списках поиск распределяется по процессам (ProcessPoolExecutor):
+    каждый процесс один раз строит индекс из снимка и обрабатывает свои порции.
+    Процессы запускаются через spawn и получают снимок явно: в этот момент
+    в процессе работают потоки резолва, а fork многопоточного процесса небезопасен.
+    """
+    workers = os.cpu_count() or 1
+    if len(domains) < PARALLEL_SIMILARITY_MIN or workers < 2:
+        packed_ips = []
+        for domain in domains:
+            similar = find_similar_domains(domain, successful_index, max_suggestions=1)
+            packed_ips.append(similar[0][1] if similar else None)
+    else:
+        chunk_size = max(1, len(domains) // (workers * 4))
+        chunks = [domains[i:i + chunk_size] for i in range(0, len(domains), chunk_size)]
+        snapshot = pickle.dumps(successful_index.domains)
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_load_index, initargs=(snapshot,)) as executor:
+            packed_ips = [packed for chunk_result in executor.map(_find_similar_chunk, chunks)
+                          for packed in chunk_result]
+    
+    return [unpack_ip(packed) if packed is not None else None for packed in packed_ips]
+
+
+def resolve_failed_domains(failed: List[Tuple[int, str]], successful_index: SuccessfulIndex,
+                           executor: ThreadPoolExecutor) -> List[Tuple[int, str, Optional[str]]]:
+    """Второй проход для неудачных доменов: поиск похожих, затем варианты TLD.
+    
+    Возвращает список (индекс, домен, IP).
+    """
+    similar_ips = find_similar_ips([domain for _, domain in failed], successful_index)
+    
+    results = []
+    variant_futures = {}
+    for (index, domain), ip in zip(failed, similar_ips):
+        if ip:
+            results.append((index, domain, ip))
+        else:
+            # Если все еще не нашли, пробуем варианты домена (разные TLD)
+            variant_futures[executor.submit(try_domain_variants, domain, 1)] = (index, domain)
+    
+    for future in as_completed(variant_futures):
+        index, domain = variant_futures[future]
+        results.append((index, domain, future.result()))
+    
+    return results
+
+
+def _resolve_domains_threaded(domains: List[str], timeout: float, max_workers: int,
+                              start_time: float, successful_index: SuccessfulIndex,
+                              on_result: Callable[[int, str, Optional[str], bool], None]):
+    """Резолвит домены в пуле потоков, передавая каждый результат в on_result(индекс, домен, IP, direct).
+    
+    Домены обрабатываются окнами по RESOLVE_WINDOW: в окне сначала резолвится
+    по одному представителю каждого SLD, затем остальные домены, после чего
+    для неудачных выполняется поиск похожих и вариантов.
+    """
+    # Создаём lock для безопасного доступа к successful_index
+    successful_lock = Lock()
+    progress = ResolveProgress(len(domains), start_time)
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for window_start in range(0, len(domains), RESOLVE_WINDOW):
+            window = range(window_start, min(window_start + RESOLVE_WINDOW, len(domains)))
+            representatives, rest = group_by_sld(domains, window)
+            representative_ips = {}
+            failed = []
+            
+            for phase in (list(representatives.values()), rest):
+                if phase is rest:
+                    # Между фазами потоки простаивают, блокировка не нужна
+                    seed_sld_representatives(successful_index, domains, representative_ips, representatives, rest)
+                
+                futures = [executor.submit(resolve_domain_wrapper,
+                                           (domains[i], timeout, i, successful_index, successful_lock))
+                           for i in phase]
+                
+                # Обрабатываем результаты по мере их поступления
+                for future in as_completed(futures):
+                    domain, ip, index = future.result()
+                    if phase is not rest:
+                        representative_ips[index] = ip
+                    if ip:
+                        on_result(index, domain, ip, True)
+                    else:
+                        failed.append((index, domain))
+                    progress.update(ip)
+            
+            if failed:
+                for index, domain, ip in resolve_failed_domains(failed, successful_index, executor):
+                    on_result(index, domain, ip, False)
+    
+    progress.close()
+
+
+async def _resolve_domains_async(domains: List[str], timeout: float, start_time: float,
+                                 successful_index: SuccessfulIndex,
+                                 on_result: Callable[[int, str, Optional[str], bool], None],
+                                 use_tcp: bool = False, max_domains: int = ASYNC_MAX_DOMAINS):
+    """Резолвит домены в одном цикле событий, передавая каждый результат в on_result(индекс, домен, IP, direct).
+    
+    Домены обрабатываются окнами по RESOLVE_WINDOW: в окне сначала резолвится
+    по одному представителю каждого SLD, затем остальные домены.
+    """
+    resolvers = AsyncResolvers(timeout, use_tcp)
+    semaphore = asyncio.Semaphore(max_domains)
+    progress = ResolveProgress(len(domains), start_time)
+    
+    for window_start in range(0, len(domains), RESOLVE_WINDOW):
+        window = range(window_start, min(window_start + RESOLVE_WINDOW, len(domains)))
+        representatives, rest = group_by_sld(domains, window)
+        representative_ips = {}
+        
+        for phase in (list(representatives.values()), rest):
+            if phase is rest:
+                seed_sld_representatives(successful_index, domains, representative_ips, representatives, rest)
+            
+            tasks = [
+                resolve_domain_wrapper_async(domains[i], timeout, i, successful_index, resolvers, semaphore)
+                for i in phase
+            ]
+            for future in asyncio.as_completed(tasks):
+                domain, ip, index, direct = await future
+                if phase is not rest:
+                    # Подобранные IP не размножаем на поддомены группы
+                    representative_ips[index] = ip if direct else None
+                on_result(index, domain, ip, direct)
+                progress.update(ip)
+    
+    progress.close()
+    resolvers.close()
+
+
+def open_cache(cache_file: str = CACHE_FILE) -> Optional[sqlite3.Connection]:
+    """Открывает (или создает) кэш результатов резолва. При ошибке возвращает None."""
+    try:
+        conn = sqlite3.connect(cache_file)
+        # Кэш не критичен - жертвуем надежностью записи ради скорости
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.execute('PRAGMA journal_mode=MEMORY')
+        conn.execute('CREATE TABLE IF NOT EXISTS cache(domain TEXT PRIMARY KEY, ip TEXT, expires REAL)')
+        return conn
+    except sqlite3.Error as e:
+        print(f"⚠️  Не удалось открыть кэш '{cache_file}': {e}")
+        return None
+
+
+def load_cached_ips(conn: sqlite3.Connection, domains: List[str]) -> dict:
+    """Возвращает {домен в нижнем регистре: IP} для доменов с неистекшей записью в кэше."""
+    cached = {}
+    now = time.time()
+    keys = [domain.lower() for domain in domains]
+    chunk_size = 500  # Ограничение SQLite на число параметров в запросе
+    
+    try:
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(
+                f'SELECT domain, ip FROM cache WHERE expires > ? AND domain IN ({placeholders})',
+                [now] + chunk)
+            cached.update(rows)
+    except sqlite3.Error as e:
+        print(f"⚠️  Ошибка чтения кэша: {e}")
+    
+    return cached
+
+
+def store_cached_ips(conn: sqlite3.Connection, results: List[Tuple[str, Optional[str]]]):
+    """Сохраняет успешные результаты резолва в кэш на CACHE_TTL секунд."""
+    expires = time.time() + CACHE_TTL
+    try:
+        conn.executemany(
+            'INSERT OR REPLACE INTO cache(domain, ip, expires) VALUES (?, ?, ?)',
+            ((domain.lower(), ip, expires) for domain, ip in results if ip))
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"⚠️  Ошибка записи в кэш: {e}")
+
+
+def run_async(coro):
+    """Запускает корутину в новом цикле событий (uvloop, если установлен)."""
+    if HAS_UVLOOP:
+        uvloop.install()
+    return asyncio.run(coro)
 
 
 def resolve_domains(domains: List[str], timeout: int = 3, max_workers: int = 50, 
-                    use_similar_fallback: bool = True) -> List[Tuple[str, Optional[str]]]:
-    """Резолвит IP-адреса для списка доменов с использованием многопоточности."""
+                    use_similar_fallback: bool = True, use_async: bool = True,
+                    use_cache: bool = True, use_tcp: bool = False,
+                    on_result: Optional[Callable[[str, Optional[str]], None]] = None,
+                    max_domains: int = ASYNC_MAX_DOMAINS
+                    ) -> Optional[List[Tuple[str, Optional[str]]]]:
+    """Резолвит IP-адреса для списка доменов асинхронно или в пуле потоков (use_async=False).
+    
+    max_workers задает число потоков, max_domains - число одновременно
+    резолвящихся доменов в асинхронном режиме.
+    Домены с неистекшей записью в кэше (use_cache=True) не резолвятся повторно.
+    С use_tcp=True серверы пула опрашиваются по TCP с конвейерной отправкой запросов
+    (только в асинхронном режиме).
+    Результаты передаются в on_result(домен, IP) в исходном порядке по мере
+    готовности; если on_result не задан, они возвращаются списком.
+    """
     total = len(domains)
     
     # Определяем оптимальное количество потоков
@@ -335,10 +1483,19 @@ def resolve_domains(domains: List[str], timeout: int = 3, max_workers: int = 50,
             max_workers = 50  # Максимум для DNS запросов
     
     print(f"\n🔍 Резолв {total} доменов...")
-    print(f"   Потоков: {max_workers}, Таймаут: {timeout}с")
+    if use_async:
+        print(f"   Асинхронный режим: до {max_domains} доменов одновременно, Таймаут: {timeout}с")
+        if not HAS_AIODNS:
+            print("   (Используется встроенный UDP клиент; для c-ares установите: pip install aiodns uvloop)")
+        if use_tcp:
+            print(f"   (Серверы пула опрашиваются по TCP: {TCP_CONNECTIONS_PER_SERVER} соединения на сервер)")
+    else:
+        print(f"   Потоков: {max_workers}, Таймаут: {timeout}с")
+        if use_tcp:
+            print("   ⚠️  Опрос по TCP доступен только в асинхронном режиме - используется UDP")
     if use_similar_fallback:
         print("   (Включен поиск похожих доменов для неудачных резолвов)")
-    if HAS_DNSPYTHON:
+    if HAS_DNSPYTHON or use_async:
         print("   (Используется расширенный режим с альтернативными DNS серверами)")
     else:
         print("   (Для лучших результатов установите: pip install dnspython)")
@@ -347,120 +1504,147 @@ def resolve_domains(domains: List[str], timeout: int = 3, max_workers: int = 50,
     else:
         print("   (Для прогресс-бара установите: pip install tqdm)")
     
-    # Сбрасываем счетчики
-    with progress_lock:
-        progress_counter['success'] = 0
-        progress_counter['failed'] = 0
-        progress_counter['total'] = 0
+    start_time = time.time()
+    
+    # Разделяем домены на найденные в кэше и требующие резолва
+    cache = open_cache() if use_cache else None
+    cached_ips = load_cached_ips(cache, domains) if cache else {}
+    to_resolve = [i for i, domain in enumerate(domains) if domain.lower() not in cached_ips]
+    if cached_ips:
+        print(f"   💾 Из кэша: {total - len(to_resolve)}, к резолву: {len(to_resolve)}")
     
-    # Словарь успешных доменов для поиска похожих (обновляется по мере обработки)
-    successful_domains = {}
+    results = None
+    if on_result is None:
+        results = []
+        on_result = lambda domain, ip: results.append((domain, ip))
+    emitter = OrderedEmitter(on_result)
     
-    # Создаём lock для безопасного доступа к successful_domains
-    successful_lock = Lock()
+    # Домены из кэша сразу участвуют в поиске похожих, а выводятся по мере
+    # продвижения резолва - иначе все они ждали бы в emitter первого неготового домена
+    successful_index = SuccessfulIndex()
+    cached_indices = []
+    for i, domain in enumerate(domains):
+        ip = cached_ips.get(domain.lower())
+        if ip:
+            successful_index.add(domain, ip)
+            cached_indices.append(i)
+    to_resolve_domains = [domains[i] for i in to_resolve]
+    cached_cursor = 0
     
-    # Подготавливаем аргументы с индексами для сохранения порядка
-    domain_args = [(domain, timeout, i, successful_domains, successful_lock) for i, domain in enumerate(domains)]
+    def put_cached_before(index: int):
+        nonlocal cached_cursor
+        while cached_cursor < len(cached_indices) and cached_indices[cached_cursor] < index:
+            domain = domains[cached_indices[cached_cursor]]
+            emitter.put(cached_indices[cached_cursor], domain, cached_ips[domain.lower()])
+            cached_cursor += 1
     
-    # Создаем словарь для результатов с индексами
-    results_dict = {}
-    start_time = time.time()
+    cache_batch = []
     
-    # Используем ThreadPoolExecutor для параллельной обработки
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Запускаем все задачи
-        future_to_domain = {
-            executor.submit(resolve_domain_wrapper, args): args[0] 
-            for args in domain_args
-        }
-        
-        # Обновляем словарь успешных доменов по мере получения результатов
-        if use_similar_fallback:
-            # Сначала делаем быстрый проход без fallback для накопления базы
-            # Но это усложнит код, поэтому просто обновляем по мере поступления
-            pass
-        
-        # Обрабатываем результаты по мере их поступления
-        if HAS_TQDM:
-            # С прогресс-баром
-            with tqdm(total=total, desc="Резолв доменов", unit="домен") as pbar:
-                for future in as_completed(future_to_domain):
-                    domain, ip, index = future.result()
-                    results_dict[index] = (domain, ip)
-                    pbar.update(1)
-                    
-                    # Обновляем описание прогресс-бара
-                    with progress_lock:
-                        success = progress_counter['success']
-                        failed = progress_counter['failed']
-                        elapsed = time.time() - start_time
-                        rate = progress_counter['total'] / elapsed if elapsed > 0 else 0
-                        pbar.set_postfix({
-                            '✓': success,
-                            '✗': failed,
-                            'скорость': f'{rate:.1f}/с'
-                        })
-        else:
-            # Без прогресс-бара - простой вывод каждые N доменов
-            completed = 0
-            last_print = 0
-            print_interval = max(1, total // 100)  # Печатаем каждые 1% или минимум каждый домен
-            
-            for future in as_completed(future_to_domain):
-                domain, ip, index = future.result()
-                results_dict[index] = (domain, ip)
-                completed += 1
-                
-                # Периодически выводим прогресс
-                if completed - last_print >= print_interval or completed == total:
-                    elapsed = time.time() - start_time
-                    rate = completed / elapsed if elapsed > 0 else 0
-                    with progress_lock:
-                        success = progress_counter['success']
-                        failed = progress_counter['failed']
-                    remaining = total - completed
-                    eta = remaining / rate if rate > 0 else 0
-                    print(f"  Прогресс: {completed}/{total} ({completed/total*100:.1f}%) | "
-                          f"✓ {success} ✗ {failed} | "
-                          f"{rate:.1f} домен/с | "
-                          f"Осталось: ~{eta:.0f}с", end='\r', flush=True)
-                    last_print = completed
-            
-            print()  # Новая строка после завершения
+    def handle_resolved(local_index: int, domain: str, ip: Optional[str], direct: bool):
+        put_cached_before(to_resolve[local_index])
+        emitter.put(to_resolve[local_index], domain, ip)
+        # В кэш попадают только IP, полученные резолвом самого домена, - не догадки
+        if cache and ip and direct:
+            cache_batch.append((domain, ip))
+            if len(cache_batch) >= CACHE_BATCH_SIZE:
+                store_cached_ips(cache, cache_batch)
+                cache_batch.clear()
     
-    # Сортируем результаты по индексу и возвращаем без индексов
-    results = [results_dict[i] for i in range(total)]
+    if use_async:
+        run_async(_resolve_domains_async(to_resolve_domains, timeout, start_time,
+                                         successful_index, handle_resolved, use_tcp, max_domains))
+    else:
+        _resolve_domains_threaded(to_resolve_domains, timeout, max_workers, start_time,
+                                  successful_index, handle_resolved)
+    put_cached_before(total)
+    
+    if cache:
+        store_cached_ips(cache, cache_batch)
+        cache.close()
     
-    elapsed_time = time.time() - start_time
+    elapsed_time = max(time.time() - start_time, 1e-6)
     print(f"\n✅ Резолв завершен за {elapsed_time:.1f}с "
           f"({total/elapsed_time:.1f} домен/с)")
     
     return results
 
 
-def generate_hosts_file(results: List[Tuple[str, Optional[str]]]) -> str:
-    """Генерирует содержимое файла hosts."""
-    lines = [
-        "# Файл hosts, сгенерированный автоматически",
-        "# Для применения: скопируйте содержимое в /etc/hosts (Linux) или C:\\Windows\\System32\\drivers\\etc\\hosts (Windows)",
-        "",
-    ]
+class OrderedEmitter:
+    """Передает результаты в исходном порядке.
+    
+    Результат с индексом i передается в emit, как только готовы все результаты
+    с меньшими индексами; в памяти держатся только ожидающие своей очереди.
+    """
     
-    successful = 0
-    failed = 0
+    def __init__(self, emit: Callable[[str, Optional[str]], None]):
+        self.emit = emit
+        self.pending = {}
+        self.next_emit = 0
     
-    for domain, ip in results:
+    def put(self, index: int, domain: str, ip: Optional[str]):
+        self.pending[index] = (domain, ip)
+        while self.next_emit in self.pending:
+            self.emit(*self.pending.pop(self.next_emit))
+            self.next_emit += 1
+
+
+def write_file_atomic(path: Path, data: bytes):
+    """Атомарно записывает байты в файл: временный файл рядом, fsync, os.replace.
+
+    При обрыве записи прежнее содержимое `path` остаётся нетронутым.
+    """
+    tmp_path = path.with_name(path.name + '.tmp')
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, path)
+
+
+class HostsFileWriter:
+    """Потоковая запись файла hosts: заголовок при создании, записи по мере
+    поступления результатов, итоговая строка при закрытии.
+
+    Записи идут во временный файл `<имя>.tmp`, который при закрытии атомарно
+    подменяет целевой — прерванный запуск не оставляет обрезанный hosts.
+    """
+    
+    def __init__(self, output_file: str = 'hosts'):
+        self.path = Path(output_file)
+        self.tmp_path = self.path.with_name(self.path.name + '.tmp')
+        # Крупный буфер: строки копятся в памяти и уходят на диск большими блоками
+        self.file = open(self.tmp_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE)
+        self._write = self.file.write
+        self._write(HOSTS_HEADER)
+        self.successful = 0
+        self.failed = 0
+    
+    def write_result(self, domain: str, ip: Optional[str]):
+        """Записывает строку hosts для одного домена."""
         if ip:
-            lines.append(f"{ip}\t{domain}")
-            successful += 1
+            self._write(f"{ip}\t{domain}\n")
+            self.successful += 1
         else:
-            lines.append(f"# {domain} - не удалось определить IP")
-            failed += 1
+            self._write(f"# {domain} - не удалось определить IP\n")
+            self.failed += 1
     
-    lines.append("")
-    lines.append(f"# Всего обработано: {len(results)}, успешно: {successful}, ошибок: {failed}")
+    def close(self):
+        """Дописывает итоговую строку, сбрасывает данные на диск и публикует файл."""
+        total = self.successful + self.failed
+        self.file.write(f"\n# Всего обработано: {total}, успешно: {self.successful}, ошибок: {self.failed}")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
     
-    return '\n'.join(lines)
+    def discard(self):
+        """Закрывает и удаляет временный файл, не трогая целевой (резолв прерван)."""
+        self.file.close()
+        self.tmp_path.unlink(missing_ok=True)
 
 
 def get_hosts_path() -> Tuple[str, str]:
@@ -487,15 +1671,15 @@ def backup_system_hosts() -> bool:
 
     try:
         # Попытка прочитать системный hosts (обычно доступно для чтения)
-        with open(hosts_path, 'r', encoding='utf-8') as f:
+        # Байты как есть: без перекодирования и с сохранением исходных переводов строк
+        with open(hosts_path, 'rb') as f:
             data = f.read()
     except Exception as e:
         print(f"⚠️ Не удалось прочитать системный hosts ({hosts_path}): {e}")
         return False
 
     try:
-        with open(backup_file, 'w', encoding='utf-8') as f:
-            f.write(data)
+        write_file_atomic(backup_file, data)
         print(f"💾 Стартовый файл hosts сохранён в: {backup_file.absolute()}")
         return True
     except Exception as e:
@@ -503,19 +1687,6 @@ def backup_system_hosts() -> bool:
         return False
 
 
-def save_hosts_file(content: str, output_file: str = 'hosts'):
-    """Сохраняет файл hosts в текущую директорию."""
-    try:
-        output_path = Path(output_file)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        print(f"\n✅ Файл '{output_path.absolute()}' успешно создан!")
-        return True
-    except Exception as e:
-        print(f"\n❌ Ошибка при сохранении файла: {e}")
-        return False
-
-
 def copy_to_system_hosts(local_file: str, system_hosts_path: str) -> bool:
     """Копирует содержимое локального файла в системный hosts."""
     try:
@@ -599,8 +1770,26 @@ def copy_to_system_hosts(local_file: str, system_hosts_path: str) -> bool:
         return False
 
 
+def parse_args() -> argparse.Namespace:
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Генератор файла hosts для обхода блокировок")
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f"не использовать кэш резолва ({CACHE_FILE})")
+    parser.add_argument('--threads', action='store_true',
+                        help="резолвить в пуле потоков вместо асинхронного режима")
+    parser.add_argument('--tcp', action='store_true',
+                        help="опрашивать серверы пула по TCP с конвейерной отправкой запросов "
+                             "(асинхронный режим)")
+    args = parser.parse_args()
+    if args.tcp and args.threads:
+        parser.error("--tcp работает только в асинхронном режиме и несовместим с --threads")
+    return args
+
+
 def main():
     """Основная функция."""
+    args = parse_args()
+    
     print("=" * 60)
     print("🌐 Генератор файла hosts для обхода блокировок")
     print("=" * 60)
@@ -621,17 +1810,9 @@ def main():
         print("❌ Не найдено ни одного домена в файле!")
         sys.exit(1)
     
-    # Удаляем дубликаты, сохраняя порядок
+    # Удаляем дубликаты, сохраняя порядок (домены нормализуются к нижнему регистру)
     original_count = len(domains)
-    seen = set()
-    unique_domains = []
-    for domain in domains:
-        domain_lower = domain.lower()  # Нормализуем к нижнему регистру
-        if domain_lower not in seen:
-            seen.add(domain_lower)
-            unique_domains.append(domain)
-    
-    domains = unique_domains
+    domains = list(dict.fromkeys(domain.lower() for domain in domains))
     duplicates_count = original_count - len(domains)
     
     print(f"✓ Найдено доменов: {original_count}")
@@ -656,17 +1837,29 @@ def main():
         timeout = 2  # Уменьшаем таймаут для очень больших списков
         max_workers = 100  # Увеличиваем потоки для очень больших списков
     
+    # В асинхронном режиме параллелизм задается числом одновременно резолвящихся доменов, а не потоков
+    max_domains = ASYNC_MAX_DOMAINS
+    
     # Для очень больших файлов предлагаем настройку
     if total_domains > 10000:
         print(f"\n⚙️  Настройки производительности:")
-        print(f"   Таймаут: {timeout}с, Потоков: {max_workers}")
+        if args.threads:
+            print(f"   Таймаут: {timeout}с, Потоков: {max_workers}")
+        else:
+            print(f"   Таймаут: {timeout}с, Доменов одновременно: {max_domains}")
         custom = input("   Изменить настройки? (y/n, Enter для пропуска): ").strip().lower()
         if custom in ['y', 'yes', 'д', 'да']:
             try:
-                workers_input = input(f"   Количество потоков (по умолчанию {max_workers}): ").strip()
-                if workers_input:
-                    max_workers = int(workers_input)
-                    max_workers = max(1, min(max_workers, 200))  # Ограничение 1-200
+                if args.threads:
+                    workers_input = input(f"   Количество потоков (по умолчанию {max_workers}): ").strip()
+                    if workers_input:
+                        max_workers = int(workers_input)
+                        max_workers = max(1, min(max_workers, 200))  # Ограничение 1-200
+                else:
+                    domains_input = input(f"   Доменов одновременно (по умолчанию {max_domains}): ").strip()
+                    if domains_input:
+                        max_domains = int(domains_input)
+                        max_domains = max(1, min(max_domains, 5000))  # Ограничение 1-5000
                 
                 timeout_input = input(f"   Таймаут в секундах (по умолчанию {timeout}): ").strip()
                 if timeout_input:
@@ -675,19 +1868,28 @@ def main():
             except ValueError:
                 print("   ⚠️  Неверный ввод, используются значения по умолчанию")
     
-    # Резолв доменов с поиском похожих доменов для неудачных резолвов
-    results = resolve_domains(domains, timeout=timeout, max_workers=max_workers, 
-                              use_similar_fallback=True)
-    
-    # Генерация hosts файла
-    print("\n📝 Генерация файла hosts...")
-    hosts_content = generate_hosts_file(results)
-    
-    # Сохранение файла в текущую директорию
+    # Файл hosts в текущей директории записывается по мере резолва
     output_file = 'hosts'
-    if not save_hosts_file(hosts_content, output_file):
+    try:
+        writer = HostsFileWriter(output_file)
+    except Exception as e:
+        print(f"\n❌ Ошибка при сохранении файла: {e}")
         sys.exit(1)
     
+    # Резолв доменов с поиском похожих доменов для неудачных резолвов
+    print(f"\n📝 Результаты записываются в файл: {writer.path.absolute()}")
+    try:
+        resolve_domains(domains, timeout=timeout, max_workers=max_workers, 
+                        use_similar_fallback=True, use_async=not args.threads,
+                        use_cache=not args.no_cache, use_tcp=args.tcp,
+                        on_result=writer.write_result, max_domains=max_domains)
+        writer.close()
+    except BaseException:
+        # Ошибка или Ctrl+C: не оставляем hosts.tmp, прежний hosts остается нетронутым
+        writer.discard()
+        raise
+    print(f"\n✅ Файл '{writer.path.absolute()}' успешно создан!")
+    
     # Предложение скопировать в системную папку
     hosts_path, os_name = get_hosts_path()
     print("\n" + "=" * 60)
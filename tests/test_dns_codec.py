@@ -0,0 +1,74 @@
+import socket
+import struct
+
+import pytest
+
+import hosts_generator as hg
+
+
+def make_response(query: bytes, records, rcode: int = 0, cname: bool = False) -> bytes:
+    """Ответ сервера на query: вопрос повторяется, имена записей сжаты ссылкой на него."""
+    txid, = struct.unpack_from('!H', query)
+    question = query[12:]
+    answers = b''
+    if cname:
+        target = hg.encode_dns_labels('alias.example.net') + b'\x00'
+        answers += b'\xc0\x0c' + struct.pack('!HHIH', 5, 1, 300, len(target)) + target
+    for ip, ttl in records:
+        answers += b'\xc0\x0c' + struct.pack('!HHIH', 1, 1, ttl, 4) + socket.inet_aton(ip)
+    count = len(records) + cname
+    return struct.pack('!HHHHHH', txid, 0x8180 | rcode, 1, count, 0, 0) + question + answers
+
+
+def test_query_layout():
+    query = hg.encode_dns_query(0x1234, 'www.Example.com.')
+    assert query[:12] == struct.pack('!HHHHHH', 0x1234, 0x0100, 1, 0, 0, 0)
+    assert query[12:] == b'\x03www\x07Example\x03com\x00\x00\x01\x00\x01'
+
+
+def test_query_idna():
+    query = hg.encode_dns_query(1, 'пример.рф')
+    assert query.endswith(b'\x08xn--p1ai\x00\x00\x01\x00\x01')
+
+
+@pytest.mark.parametrize('name', ['bad..com', 'a' * 64 + '.com'])
+def test_query_rejects_bad_labels(name):
+    with pytest.raises(ValueError):
+        hg.encode_dns_query(1, name)
+
+
+def test_round_trip():
+    query = hg.encode_dns_query(4242, 'example.com')
+    response = make_response(query, [('93.184.216.34', 60), ('93.184.216.35', 120)])
+    
+    txid, flags, answers = hg.parse_dns_response(response)
+    
+    assert txid == 4242
+    assert flags & 0x0F == 0
+    assert answers == [hg.DnsAnswer('93.184.216.34', 60), hg.DnsAnswer('93.184.216.35', 120)]
+    assert hg.check_dns_answers('example.com', flags, answers) == answers
+
+
+def test_round_trip_skips_cname():
+    query = hg.encode_dns_query(7, 'www.example.com')
+    response = make_response(query, [('10.0.0.1', 30)], cname=True)
+    
+    assert hg.parse_dns_response(response)[2] == [hg.DnsAnswer('10.0.0.1', 30)]
+
+
+def test_round_trip_nxdomain():
+    query = hg.encode_dns_query(9, 'missing.example')
+    txid, flags, answers = hg.parse_dns_response(make_response(query, [], rcode=3))
+    
+    assert (txid, answers) == (9, [])
+    with pytest.raises(hg.DnsQueryError):
+        hg.check_dns_answers('missing.example', flags, answers)
+
+
+@pytest.mark.parametrize('rcode', [2, 5])
+def test_server_refusal_is_server_error(rcode):
+    query = hg.encode_dns_query(1, 'example.com')
+    _, flags, answers = hg.parse_dns_response(make_response(query, [], rcode=rcode))
+    
+    with pytest.raises(hg.DnsServerError):
+        hg.check_dns_answers('example.com', flags, answers)
@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+import hosts_generator as hg
+
+
+def levenshtein(a: str, b: str) -> int:
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+# Линейный перебор всех базовых имен - поведение до появления индекса
+def scan_prefix(bases, base_name):
+    return {other for other in bases
+            if other != base_name and abs(len(other) - len(base_name)) <= hg.SuccessfulIndex.MAX_PREFIX_DIFF
+            and (base_name.startswith(other) or other.startswith(base_name))}
+
+
+def scan_fragment(bases, base_name):
+    return {other for other in bases
+            if other != base_name and abs(len(other) - len(base_name)) <= hg.SuccessfulIndex.MAX_FRAGMENT_DIFF
+            and (base_name in other or other in base_name)}
+
+
+def scan_fuzzy(bases, base_name):
+    return {other for other in bases
+            if other != base_name and other[:1] == base_name[:1]
+            and levenshtein(base_name, other) <= hg.SuccessfulIndex.MAX_EDIT_DISTANCE}
+
+
+def random_name(rng: random.Random) -> str:
+    # Маленький алфавит - много имен, связанных префиксами, вхождениями и опечатками
+    return ''.join(rng.choice('abc-') for _ in range(rng.randint(1, 12))).strip('-') or 'a'
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    rng = random.Random(7)
+    domains = {f'{random_name(rng)}.{rng.choice(["com", "org", "net"])}': hg.pack_ip('192.0.2.1')
+               for _ in range(1500)}
+    index = hg.SuccessfulIndex.from_domains(domains)
+    queries = [random_name(rng) for _ in range(150)] + ['a', 'ab', 'abc', 'abcabcabcabc']
+    return index, queries
+
+
+def test_index_matches_linear_scan(corpus, monkeypatch):
+    monkeypatch.setattr(hg.SuccessfulIndex, 'MAX_FUZZY_CANDIDATES', 10 ** 6)
+    index, queries = corpus
+    bases = set(index.by_base)
+    
+    for query in queries:
+        assert set(index.prefix_related(query)) == scan_prefix(bases, query), query
+        assert set(index.fragment_related(query)) == scan_fragment(bases, query), query
+        assert set(index.fuzzy_related(query)) == scan_fuzzy(bases, query), query
+
+
+def test_find_similar_domains_matches_linear_scan(corpus, monkeypatch):
+    monkeypatch.setattr(hg.SuccessfulIndex, 'MAX_FUZZY_CANDIDATES', 10 ** 6)
+    index, queries = corpus
+    bases = set(index.by_base)
+    
+    for query in queries:
+        expected = {domain for domain in index.domains
+                    if domain.rpartition('.')[0] == query and not domain.endswith('.info')}
+        expected |= {domain for base in scan_prefix(bases, query) | scan_fragment(bases, query)
+                     | scan_fuzzy(bases, query) for domain in index.by_base[base]}
+        
+        found = hg.find_similar_domains(query + '.info', index, max_suggestions=10 ** 6)
+        
+        assert {domain for domain, _, _ in found} == expected, query
+        assert len(found) == len(expected)
+
+
+def test_bounded_levenshtein_matches_full_distance():
+    rng = random.Random(3)
+    for _ in range(500):
+        a = random_name(rng)
+        b = random_name(rng)
+        for k in range(4):
+            assert hg.bounded_levenshtein(a, b, k) == min(levenshtein(a, b), k + 1), (a, b, k)
+
+
+def test_index_ignores_repeats_and_bad_ips():
+    index = hg.SuccessfulIndex()
+    index.add('example.com', '192.0.2.1')
+    index.add('example.com', '192.0.2.2')
+    index.add('example.org', 'not an ip')
+    
+    assert len(index) == 1
+    assert index.by_base == {'example': ['example.com']}
+    assert hg.unpack_ip(index.domains['example.com']) == '192.0.2.2'
@@ -0,0 +1,123 @@
+import asyncio
+import socket
+import struct
+
+import pytest
+
+import hosts_generator as hg
+
+
+def answer(query: bytes, ip: str = '192.0.2.1') -> bytes:
+    """A-ответ на query с длиной сообщения в начале (формат DNS поверх TCP)."""
+    txid, = struct.unpack_from('!H', query)
+    response = (struct.pack('!HHHHHH', txid, 0x8180, 1, 1, 0, 0) + query[12:]
+                + b'\xc0\x0c' + struct.pack('!HHIH', 1, 1, 60, 4) + socket.inet_aton(ip))
+    return struct.pack('!H', len(response)) + response
+
+
+async def read_query(reader: asyncio.StreamReader) -> bytes:
+    length, = struct.unpack('!H', await reader.readexactly(2))
+    return await reader.readexactly(length)
+
+
+def run_with_server(monkeypatch, handler, client):
+    """Запускает client(resolver) против локального TCP DNS сервера с обработчиком handler."""
+    async def scenario():
+        server = await asyncio.start_server(handler, '127.0.0.1', 0)
+        monkeypatch.setattr(hg, 'DNS_PORT', server.sockets[0].getsockname()[1])
+        resolver = hg.TcpDnsResolver(['127.0.0.1'])
+        try:
+            async with server:
+                return await asyncio.wait_for(client(resolver), 10)
+        finally:
+            resolver.close()
+    
+    return asyncio.run(scenario())
+
+
+def query_all(count: int):
+    async def client(resolver):
+        # Один SLD - все запросы идут через одно соединение
+        return await asyncio.gather(*(resolver.query(f'host{i}.example.com') for i in range(count)),
+                                    return_exceptions=True)
+    return client
+
+
+def test_retries_after_server_drops_connection(monkeypatch):
+    connections = []
+    
+    async def handler(reader, writer):
+        # Отвечает на 3 запроса и закрывает соединение, бросая остальные неотвеченными
+        connections.append(writer)
+        try:
+            for _ in range(3):
+                writer.write(answer(await read_query(reader)))
+            await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        writer.close()
+    
+    results = run_with_server(monkeypatch, handler, query_all(30))
+    
+    assert results == [[hg.DnsAnswer('192.0.2.1', 60)]] * 30
+    assert len(connections) >= 10
+
+
+def test_gives_up_when_connection_makes_no_progress(monkeypatch):
+    async def handler(reader, writer):
+        await read_query(reader)
+        writer.close()
+    
+    results = run_with_server(monkeypatch, handler, query_all(5))
+    
+    assert all(isinstance(result, hg.DnsConnectionClosed) for result in results)
+    assert not any(result.progressed for result in results)
+
+
+def test_caps_pipelined_queries(monkeypatch):
+    monkeypatch.setattr(hg, 'TCP_MAX_PIPELINED', 4)
+    outstanding = 0
+    max_outstanding = 0
+    
+    async def handler(reader, writer):
+        nonlocal outstanding, max_outstanding
+        
+        async def reply(query):
+            nonlocal outstanding
+            await asyncio.sleep(0.01)
+            outstanding -= 1
+            writer.write(answer(query))
+        
+        tasks = []
+        try:
+            while True:
+                query = await read_query(reader)
+                outstanding += 1
+                max_outstanding = max(max_outstanding, outstanding)
+                tasks.append(asyncio.ensure_future(reply(query)))
+        except asyncio.IncompleteReadError:
+            pass
+        for task in tasks:
+            task.cancel()
+        writer.close()
+    
+    results = run_with_server(monkeypatch, handler, query_all(40))
+    
+    assert results == [[hg.DnsAnswer('192.0.2.1', 60)]] * 40
+    assert max_outstanding == 4
+
+
+def test_connection_refused_is_server_error(monkeypatch):
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        monkeypatch.setattr(hg, 'DNS_PORT', probe.getsockname()[1])
+    
+    async def scenario():
+        resolver = hg.TcpDnsResolver(['127.0.0.1'])
+        try:
+            await resolver.query('example.com')
+        finally:
+            resolver.close()
+    
+    with pytest.raises(hg.DnsServerError):
+        asyncio.run(scenario())